@@ -1,11 +1,23 @@
 # main.py
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from routers import upload
 from dotenv import load_dotenv
 load_dotenv()
 
-app = FastAPI()
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from routers import upload, query
+from services.embedding import embed_text
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedding model and run one encode so the first upload
+    # doesn't pay for model loading and kernel warm-up
+    await run_in_threadpool(embed_text, "warmup")
+    yield
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 
 app.add_middleware(
@@ -17,6 +29,7 @@ app.add_middleware(
 )
 
 app.include_router(upload.router, prefix="/api")
+app.include_router(query.router, prefix="/api")
 
 @app.get("/")
 def root():
@@ -2,11 +2,14 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import os
-from vector_store.chroma_store import collection
-from collections import Counter
+import heapq
+import operator
 import re
+from collections import Counter
+from vector_store.chroma_store import get_collection
 
 st.set_page_config(
     page_title="Analytics - IntelliDoc",
@@ -39,55 +42,102 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Word tokenizer, compiled once at import. It only matches alphabetic words of
+# three or more letters, so short tokens and numbers never reach the Counter.
+# google-re2 (pip install google-re2) runs it as a linear-time automaton;
+# note RE2's \w only matches ASCII.
+try:
+    import re2
+    WORD_RE = re2.compile(r'\b[^\W\d_]{3,}\b')
+except ImportError:
+    WORD_RE = re.compile(r'\b[^\W\d_]{3,}\b')
+
+# Common stop words excluded from word frequency analysis
+STOP_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them'})
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_collection_stats(passage_count):
+    """Scan the collection and build the analytics bundle.
+
+    ``passage_count`` only serves as the cache key so that new uploads
+    invalidate the cached result.
+    """
+    # Get all passages along with the document each one was split from
+    results = get_collection().get(include=['documents', 'metadatas'])
+    
+    if not results['documents']:
+        return None
+    
+    documents = results['documents']
+    metadatas = [metadata or {} for metadata in results['metadatas']]
+    
+    # Passage length distribution, shared by the summary, histogram and box plot
+    passage_lengths = np.fromiter((len(doc) for doc in documents), dtype=np.int64, count=len(documents))
+    
+    # Calculate statistics; passages without a parent count as their own document
+    total_passages = len(documents)
+    total_docs = len({metadata.get('parent', passage_id) for passage_id, metadata in zip(results['ids'], metadatas)})
+    total_chars = int(passage_lengths.sum())
+    avg_passage_length = total_chars / total_passages if total_passages > 0 else 0
+    
+    # Word frequency analysis, one document at a time so only a single
+    # document's tokens are ever materialized
+    word_freq = Counter()
+    for doc in documents:
+        word_freq.update(word for word in WORD_RE.findall(doc.lower()) if word not in STOP_WORDS)
+    
+    # Per-passage table, built here so reruns never see the raw texts
+    texts = pd.Series(documents)
+    previews = texts.str.slice(0, 100)
+    details = pd.DataFrame({
+        'Document': [metadata.get('name', '') for metadata in metadatas],
+        'Passage': pd.array([metadata.get('chunk') for metadata in metadatas], dtype='Int64'),
+        'Length (chars)': passage_lengths,
+        'Word Count': texts.str.count(r'\S+'),
+        'Preview': np.where(passage_lengths > 100, previews + '...', previews)
+    })
+    
+    return {
+        'total_docs': total_docs,
+        'total_passages': total_passages,
+        'total_chars': total_chars,
+        'avg_passage_length': avg_passage_length,
+        'unique_words': len(word_freq),
+        'top_words': create_word_cloud_data(word_freq, 50),
+        'passage_lengths': passage_lengths,
+        'length_histogram': np.histogram(passage_lengths, bins=20),
+        'length_box': summarize_box(passage_lengths),
+        'details': details
+    }
+
+def summarize_box(values):
+    """Tukey box-plot statistics, so the chart ships five numbers instead of every point"""
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    return {
+        'q1': q1,
+        'median': median,
+        'q3': q3,
+        'lowerfence': inside.min(),
+        'upperfence': inside.max(),
+        'outliers': values[(values < inside.min()) | (values > inside.max())]
+    }
+
 def get_collection_stats():
     """Get statistics from the vector store collection"""
     try:
-        # Get all documents
-        results = collection.get()
-        
-        if not results['documents']:
-            return None
-        
-        documents = results['documents']
-        ids = results['ids']
-        
-        # Calculate statistics
-        total_docs = len(documents)
-        total_chars = sum(len(doc) for doc in documents)
-        avg_doc_length = total_chars / total_docs if total_docs > 0 else 0
-        
-        # Word frequency analysis
-        all_text = ' '.join(documents)
-        words = re.findall(r'\b\w+\b', all_text.lower())
-        word_freq = Counter(words)
-        
-        # Document length distribution
-        doc_lengths = [len(doc) for doc in documents]
-        
-        return {
-            'total_docs': total_docs,
-            'total_chars': total_chars,
-            'avg_doc_length': avg_doc_length,
-            'word_freq': word_freq,
-            'doc_lengths': doc_lengths,
-            'documents': documents,
-            'ids': ids
-        }
+        return load_collection_stats(get_collection().count())
     except Exception as e:
         st.error(f"Error getting collection stats: {str(e)}")
         return None
 
 def create_word_cloud_data(word_freq, top_n=20):
     """Create data for word frequency visualization"""
-    # Filter out common stop words
-    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them'}
+    # Stop words and short tokens are already dropped during tokenization
+    top_words = heapq.nlargest(top_n, word_freq.items(), key=operator.itemgetter(1))
     
-    filtered_freq = {word: count for word, count in word_freq.items() 
-                    if word not in stop_words and len(word) > 2}
-    
-    top_words = dict(sorted(filtered_freq.items(), key=lambda x: x[1], reverse=True)[:top_n])
-    
-    return top_words
+    return dict(top_words)
 
 def main():
     st.markdown('<h1 class="analytics-header">📊 Document Analytics</h1>', unsafe_allow_html=True)
@@ -101,7 +151,7 @@ def main():
     
     # Key Metrics Row
     st.markdown("## 📈 Key Metrics")
-    col1, col2, col3, col4 = st.columns(4)
+    col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
         st.metric(
@@ -112,22 +162,29 @@ def main():
     
     with col2:
         st.metric(
-            label="📝 Total Characters",
-            value=f"{stats['total_chars']:,}",
+            label="🧩 Total Passages",
+            value=f"{stats['total_passages']:,}",
             delta=None
         )
     
     with col3:
         st.metric(
-            label="📏 Avg Document Length",
-            value=f"{stats['avg_doc_length']:.0f} chars",
+            label="📝 Total Characters",
+            value=f"{stats['total_chars']:,}",
             delta=None
         )
     
     with col4:
+        st.metric(
+            label="📏 Avg Passage Length",
+            value=f"{stats['avg_passage_length']:.0f} chars",
+            delta=None
+        )
+    
+    with col5:
         st.metric(
             label="🔤 Unique Words",
-            value=f"{len(stats['word_freq']):,}",
+            value=f"{stats['unique_words']:,}",
             delta=None
         )
     
@@ -135,17 +192,20 @@ def main():
     col1, col2 = st.columns(2)
     
     with col1:
-        st.markdown("### 📊 Document Length Distribution")
+        st.markdown("### 📊 Passage Length Distribution")
         
-        # Create histogram of document lengths
-        fig_hist = px.histogram(
-            x=stats['doc_lengths'],
-            nbins=20,
-            title="Distribution of Document Lengths",
-            labels={'x': 'Document Length (characters)', 'y': 'Number of Documents'},
-            color_discrete_sequence=['#667eea']
-        )
+        # Create histogram of passage lengths from the pre-binned counts
+        counts, edges = stats['length_histogram']
+        fig_hist = go.Figure(go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2,
+            y=counts,
+            width=np.diff(edges),
+            marker_color='#667eea'
+        ))
         fig_hist.update_layout(
+            title="Distribution of Passage Lengths",
+            xaxis_title="Passage Length (characters)",
+            yaxis_title="Number of Passages",
             showlegend=False,
             plot_bgcolor='rgba(0,0,0,0)',
             paper_bgcolor='rgba(0,0,0,0)'
@@ -156,7 +216,7 @@ def main():
         st.markdown("### 🔤 Top Words Frequency")
         
         # Create word frequency chart
-        top_words = create_word_cloud_data(stats['word_freq'], 15)
+        top_words = dict(list(stats['top_words'].items())[:15])
         
         if top_words:
             words_df = pd.DataFrame(list(top_words.items()), columns=['Word', 'Frequency'])
@@ -178,20 +238,10 @@ def main():
             )
             st.plotly_chart(fig_words, use_container_width=True)
     
-    # Document Details Section
-    st.markdown("## 📋 Document Details")
-    
-    # Create a dataframe for document details
-    doc_data = []
-    for i, (doc_id, doc_text) in enumerate(zip(stats['ids'], stats['documents'])):
-        doc_data.append({
-            'Document ID': doc_id[:8] + '...',  # Shortened ID for display
-            'Length (chars)': len(doc_text),
-            'Word Count': len(doc_text.split()),
-            'Preview': doc_text[:100] + '...' if len(doc_text) > 100 else doc_text
-        })
+    # Passage Details Section
+    st.markdown("## 📋 Passage Details")
     
-    docs_df = pd.DataFrame(doc_data)
+    docs_df = stats['details']
     
     # Display the dataframe
     st.dataframe(
@@ -199,7 +249,8 @@ def main():
         use_container_width=True,
         hide_index=True,
         column_config={
-            "Document ID": st.column_config.TextColumn("Document ID", width="small"),
+            "Document": st.column_config.TextColumn("Document", width="medium"),
+            "Passage": st.column_config.NumberColumn("Passage", width="small"),
             "Length (chars)": st.column_config.NumberColumn("Length (chars)", width="small"),
             "Word Count": st.column_config.NumberColumn("Word Count", width="small"),
             "Preview": st.column_config.TextColumn("Preview", width="large")
@@ -212,18 +263,30 @@ def main():
     col1, col2 = st.columns(2)
     
     with col1:
-        st.markdown("### 📈 Document Size Analysis")
+        st.markdown("### 📈 Passage Size Analysis")
         
-        # Box plot for document lengths
+        # Box plot for passage lengths from precomputed quartiles and fences
+        box = stats['length_box']
         fig_box = go.Figure()
         fig_box.add_trace(go.Box(
-            y=stats['doc_lengths'],
-            name="Document Lengths",
-            boxpoints='outliers',
+            x=["Passage Lengths"],
+            q1=[box['q1']],
+            median=[box['median']],
+            q3=[box['q3']],
+            lowerfence=[box['lowerfence']],
+            upperfence=[box['upperfence']],
+            name="Passage Lengths",
             marker_color='#667eea'
         ))
+        if len(box['outliers']):
+            fig_box.add_trace(go.Scatter(
+                x=["Passage Lengths"] * len(box['outliers']),
+                y=box['outliers'],
+                mode='markers',
+                marker_color='#667eea'
+            ))
         fig_box.update_layout(
-            title="Document Length Distribution (Box Plot)",
+            title="Passage Length Distribution (Box Plot)",
             yaxis_title="Characters",
             showlegend=False,
             plot_bgcolor='rgba(0,0,0,0)',
@@ -235,12 +298,12 @@ def main():
         st.markdown("### 🎯 Collection Summary")
         
         # Summary statistics
-        doc_lengths = stats['doc_lengths']
+        passage_lengths = stats['passage_lengths']
         summary_stats = {
-            'Minimum Length': min(doc_lengths),
-            'Maximum Length': max(doc_lengths),
-            'Median Length': sorted(doc_lengths)[len(doc_lengths)//2],
-            'Standard Deviation': pd.Series(doc_lengths).std()
+            'Minimum Length': passage_lengths.min(),
+            'Maximum Length': passage_lengths.max(),
+            'Median Length': np.median(passage_lengths),
+            'Standard Deviation': passage_lengths.std(ddof=1) if len(passage_lengths) > 1 else 0.0
         }
         
         for stat, value in summary_stats.items():
@@ -257,12 +320,13 @@ def main():
             export_data = {
                 'summary': {
                     'total_documents': stats['total_docs'],
+                    'total_passages': stats['total_passages'],
                     'total_characters': stats['total_chars'],
-                    'average_length': stats['avg_doc_length'],
-                    'unique_words': len(stats['word_freq'])
+                    'average_passage_length': stats['avg_passage_length'],
+                    'unique_words': stats['unique_words']
                 },
-                'document_details': doc_data,
-                'top_words': dict(list(create_word_cloud_data(stats['word_freq'], 50).items()))
+                'document_details': docs_df.to_dict('records'),
+                'top_words': stats['top_words']
             }
             
             st.download_button(
@@ -273,11 +337,11 @@ def main():
             )
     
     with col2:
-        if st.button("📋 Export Document List"):
+        if st.button("📋 Export Passage List"):
             st.download_button(
                 label="💾 Download CSV",
                 data=docs_df.to_csv(index=False),
-                file_name=f"document_list_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                file_name=f"passage_list_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                 mime="text/csv"
             )
 
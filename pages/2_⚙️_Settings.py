@@ -2,7 +2,7 @@ import streamlit as st
 import os
 from pathlib import Path
 import json
-from vector_store.chroma_store import collection, client
+from vector_store.chroma_store import get_collection, reset_vectorstore
 import shutil
 
 st.set_page_config(
@@ -94,7 +94,7 @@ def get_system_info():
     """Get system information"""
     try:
         # Vector store info
-        doc_count = collection.count()
+        doc_count = get_collection().count()
         
         # Check if chroma_data directory exists and get size
         chroma_path = Path("chroma_data")
@@ -120,10 +120,7 @@ def get_system_info():
 def clear_vector_store():
     """Clear all documents from the vector store"""
     try:
-        # Get all document IDs
-        results = collection.get()
-        if results['ids']:
-            collection.delete(ids=results['ids'])
+        reset_vectorstore()
         return True
     except Exception as e:
         st.error(f"Error clearing vector store: {str(e)}")
@@ -288,7 +285,7 @@ def main():
         with col1:
             if st.button("📋 Export Vector Store Metadata"):
                 try:
-                    results = collection.get()
+                    results = get_collection().get()
                     export_data = {
                         'document_count': len(results['ids']),
                         'document_ids': results['ids'],
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+IntelliDoc Embedding Model Quantizer
+
+Exports all-MiniLM-L6-v2 to ONNX and applies dynamic int8 quantization so
+services/embedding.py can serve it through ONNX Runtime instead of PyTorch.
+"""
+
+import os
+import sys
+import subprocess
+from pathlib import Path
+
+HF_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+def export_onnx(output_dir: Path):
+    """Export the FP32 model and its tokenizer with optimum"""
+    subprocess.run([
+        "optimum-cli", "export", "onnx",
+        "--model", HF_MODEL_NAME,
+        "--task", "feature-extraction",
+        str(output_dir)
+    ], check=True)
+
+def quantize(output_dir: Path):
+    """Quantize the exported graph weights to unsigned int8"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(
+        str(output_dir / "model.onnx"),
+        str(output_dir / "model.int8.onnx"),
+        weight_type=QuantType.QUInt8
+    )
+
+def main():
+    """Main function"""
+    output_dir = Path(os.getenv("EMBEDDING_ONNX_DIR", "onnx_minilm"))
+
+    print(f"📦 Exporting {HF_MODEL_NAME} to {output_dir}/ ...")
+    try:
+        export_onnx(output_dir)
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"❌ ONNX export failed: {e}")
+        print("💡 Install the exporter with: pip install -r requirements.txt")
+        return 1
+
+    print("⚙️  Applying dynamic int8 quantization...")
+    quantize(output_dir)
+
+    print(f"✅ Quantized model written to {output_dir / 'model.int8.onnx'}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
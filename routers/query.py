@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+import orjson
+from services.rag import get_rag_chain
+
+
+router = APIRouter()
+
+class QueryRequest(BaseModel):
+    question: str
+
+@router.post("/query")
+async def query_documents(request: QueryRequest):
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question must not be empty")
+
+    # The first call imports LangChain and builds the Gemini client; keep it off the event loop
+    rag_chain = await run_in_threadpool(get_rag_chain)
+    if rag_chain is None:
+        raise HTTPException(status_code=503, detail="RAG chain is not available; check GOOGLE_API_KEY")
+
+    async def event_stream():
+        # Server-sent events: one JSON-encoded text fragment per event as Gemini emits tokens
+        async for token in rag_chain.astream(request.question):
+            yield b"data: " + orjson.dumps(token) + b"\n\n"
+        yield b"event: end\ndata: {}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
@@ -1,28 +1,62 @@
 from fastapi import APIRouter, File, UploadFile, HTTPException
-from utils.parser import parse_file
+from fastapi.concurrency import run_in_threadpool
 from pathlib import Path
-import uuid
-from services.embedding import embed_text
-from vector_store.chroma_store import add_to_vectorstore
+from tempfile import NamedTemporaryFile
+import os
+from services.ingest import document_hasher, index_document
+from vector_store.chroma_store import indexed_passage_count
 
 
 router = APIRouter()
 
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 10 * 1024 * 1024))
+READ_CHUNK_SIZE = 1024 * 1024
+
+async def read_upload(file: UploadFile, dest, digest=None) -> int:
+    """Copy the upload into dest in fixed-size chunks, rejecting it once it exceeds MAX_FILE_SIZE.
+
+    When a hashlib object is given as digest it is updated with every chunk.
+    """
+    size = 0
+    while chunk := await file.read(READ_CHUNK_SIZE):
+        size += len(chunk)
+        if size > MAX_FILE_SIZE:
+            raise HTTPException(status_code=413, detail="File exceeds the maximum allowed size")
+        if digest is not None:
+            digest.update(chunk)
+        dest.write(chunk)
+    return size
+
 @router.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
     if file.content_type not in ["application/pdf", "text/plain"]:
         raise HTTPException(status_code=400, detail="Only PDF or TXT files are allowed")
 
-    contents = await file.read()
     filename = Path(file.filename)
-    
-    text = parse_file(contents, filename.suffix)
-    
-    if not text.strip():
+    digest = document_hasher()
+
+    # Uploads are written to a named file so PyMuPDF can open them by path
+    # and read pages on demand rather than from a copy held in memory
+    tmp = NamedTemporaryFile(suffix=filename.suffix, delete=False)
+    try:
+        with tmp:
+            await read_upload(file, tmp, digest)
+
+        # The content hash is the document id, so recent re-uploads skip embedding;
+        # confirming a hit queries Chroma, so it also runs off the event loop
+        doc_id = digest.hexdigest()
+        chunk_count = await run_in_threadpool(indexed_passage_count, doc_id)
+        if chunk_count is not None:
+            return {"filename": file.filename, "doc_id": doc_id, "chunks": chunk_count, "message": "Document already indexed"}
+
+        # Parsing and embedding are CPU-bound; keep them off the event loop
+        chunk_count = await run_in_threadpool(
+            index_document, doc_id, file.filename, tmp.name, filename.suffix
+        )
+    finally:
+        os.unlink(tmp.name)
+
+    if not chunk_count:
         raise HTTPException(status_code=400, detail="Parsed file is empty")
-    
-    doc_id = str(uuid.uuid4())
-    embedding = embed_text(text)
-    add_to_vectorstore(doc_id, text, embedding)
 
-    return {"filename": file.filename, "doc_id": doc_id, "message": "Document uploaded and embedded"}
\ No newline at end of file
+    return {"filename": file.filename, "doc_id": doc_id, "chunks": chunk_count, "message": "Document uploaded and embedded"}
@@ -9,6 +9,7 @@ with proper environment setup and configuration.
 import os
 import sys
 import subprocess
+from importlib.util import find_spec
 from pathlib import Path
 
 def check_dependencies():
@@ -23,13 +24,11 @@ def check_dependencies():
         'fastapi'
     ]
     
-    missing_packages = []
-    
-    for package in required_packages:
-        try:
-            __import__(package.replace('-', '_'))
-        except ImportError:
-            missing_packages.append(package)
+    # find_spec only locates the package; importing it would run heavy init code (torch, grpc, ...)
+    missing_packages = [
+        package for package in required_packages
+        if find_spec(package.replace('-', '_')) is None
+    ]
     
     if missing_packages:
         print("❌ Missing required packages:")
@@ -1,7 +1,152 @@
-from sentence_transformers import SentenceTransformer
+import os
+import threading
+from typing import List
 
-# Load model once
-model = SentenceTransformer("all-MiniLM-L6-v2")
+import numpy as np
 
-def embed_text(text: str):
-    return model.encode([text])[0] 
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Directory produced by quantize_embedding_model.py
+ONNX_MODEL_DIR = os.getenv("EMBEDDING_ONNX_DIR", "onnx_minilm")
+ONNX_MODEL_FILE = "model.int8.onnx"
+
+# "auto" uses the ONNX export when present, "onnx" requires it, "torch" forces PyTorch
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "auto").lower()
+
+EMBED_BATCH_SIZE = 64
+
+class OnnxEmbeddingModel:
+    """MiniLM served from a dynamically int8-quantized ONNX graph.
+
+    Mirrors the subset of ``SentenceTransformer.encode`` used by this project
+    so either backend can be returned by ``get_model``.
+    """
+
+    def __init__(self, model_dir: str, max_length: int = 256):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = os.cpu_count() or 1
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_length = max_length
+
+    def encode(self, texts, batch_size: int = 32, normalize_embeddings: bool = False,
+               convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        if isinstance(texts, str):
+            return self.encode([texts], batch_size, normalize_embeddings)[0]
+
+        # Batch texts of similar length together to minimize padding, like
+        # SentenceTransformer.encode does, and restore the order at the end
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        sorted_texts = [texts[i] for i in order]
+
+        batches = []
+        for start in range(0, len(sorted_texts), batch_size):
+            encoded = self.tokenizer(
+                sorted_texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+
+            # Mean-pool over real tokens only
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32))
+
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+        embeddings = np.empty((len(texts), batches[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.vstack(batches)
+        return embeddings
+
+def _embed_device() -> str:
+    """EMBED_DEVICE when set, otherwise CUDA if available, otherwise CPU"""
+    device = os.getenv("EMBED_DEVICE")
+    if device:
+        return device
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def _load_model():
+    """Prefer the quantized ONNX export on CPU, otherwise the PyTorch model.
+
+    On CUDA the PyTorch model runs in FP16; the int8 ONNX graph is CPU-only.
+    The device is only probed, which imports torch, when the choice
+    depends on it.
+    """
+    onnx_path = os.path.join(ONNX_MODEL_DIR, ONNX_MODEL_FILE)
+    device = None
+    if EMBEDDING_BACKEND == "onnx":
+        use_onnx = True
+    elif EMBEDDING_BACKEND == "auto" and os.path.exists(onnx_path):
+        # The export exists, so only a GPU would make PyTorch the better choice
+        device = _embed_device()
+        use_onnx = device == "cpu"
+    else:
+        use_onnx = False
+    if use_onnx:
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"{onnx_path} not found; run quantize_embedding_model.py first")
+        return OnnxEmbeddingModel(ONNX_MODEL_DIR)
+
+    if device is None:
+        device = _embed_device()
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    # Let the transformer forward pass use every available core
+    torch.set_num_threads(os.cpu_count() or 1)
+    torch.set_float32_matmul_precision("high")
+
+    model = SentenceTransformer(MODEL_NAME, device=device)
+    if device.startswith("cuda"):
+        # Halves VRAM and uses tensor cores; embed_texts casts results back to float32
+        model.half()
+    return model
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """Return the process-wide embedding model, loading it on first use"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            # Load model once
+            if _model is None:
+                _model = _load_model()
+    return _model
+
+def embed_texts(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """Embed a list of texts in a single batched encode call.
+
+    Both backends group texts of similar length into the same batch.
+    """
+    return get_model().encode(
+        texts,
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    ).astype(np.float32, copy=False)
+
+def embed_text(text: str) -> np.ndarray:
+    return embed_texts([text])[0]
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+
+from services.embedding import OnnxEmbeddingModel, embed_texts, get_model
+
+CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "cache/emb")
+CACHE_SIZE_LIMIT = 1 << 30
+MEMORY_CACHE_SIZE = 4096
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def quantize_int8(vectors: np.ndarray):
+    """Symmetric per-vector int8 quantization, returning (codes, scales).
+
+    dequantize_int8 reverses it to within half a quantization step per
+    component.
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.round(vectors / scales[:, np.newaxis]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def dequantize_int8(codes: np.ndarray, scales) -> np.ndarray:
+    return codes.astype(np.float32) * np.asarray(scales, dtype=np.float32).reshape(-1, 1)
+
+class EmbeddingCache:
+    """Embeddings keyed by the blake2b hash of their text.
+
+    Recently used vectors are kept in an in-memory LRU of ``max_memory``
+    entries; every vector is also written to a diskcache store, so
+    identical passages skip the model across restarts and across
+    processes. On disk vectors are int8 codes followed by a float32
+    scale, a quarter of their float32 size.
+    """
+
+    def __init__(self, directory: str, max_memory: int = MEMORY_CACHE_SIZE):
+        from diskcache import Cache
+
+        self.max_memory = max_memory
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = Cache(directory, size_limit=CACHE_SIZE_LIMIT)
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                return vector
+
+        data = self._disk.get(key)
+        if data is None:
+            return None
+        codes = np.frombuffer(data, dtype=np.int8, count=len(data) - 4)
+        scale = np.frombuffer(data, dtype=np.float32, offset=len(data) - 4)
+        vector = dequantize_int8(codes, scale)[0]
+        vector.setflags(write=False)
+        self._remember(key, vector)
+        return vector
+
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            if len(self._memory) > self.max_memory:
+                self._memory.popitem(last=False)
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, running the model only on those not cached yet"""
+        keys = [text_hash(text) for text in texts]
+        vectors = [self._get(key) for key in keys]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # One batched encode call for every miss
+            computed = embed_texts([texts[i] for i in missing])
+            # All misses are written in one SQLite transaction rather than one commit each
+            with self._disk.transact():
+                for i, vector in zip(missing, computed):
+                    vector = np.array(vector, dtype=np.float32)
+                    vector.setflags(write=False)
+                    vectors[i] = vector
+                    self._remember(keys[i], vector)
+                    codes, scales = quantize_int8(vector)
+                    self._disk.set(keys[i], codes.tobytes() + scales.tobytes())
+
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(vectors)
+
+@lru_cache(maxsize=1)
+def get_embedding_cache() -> EmbeddingCache:
+    # Backends produce slightly different vectors, so each gets its own store
+    backend = "onnx-int8" if isinstance(get_model(), OnnxEmbeddingModel) else "torch"
+    return EmbeddingCache(os.path.join(CACHE_DIR, backend, "int8"))
+
+def embed_texts_cached(texts: List[str]) -> np.ndarray:
+    """Drop-in for embed_texts that reuses embeddings of previously seen texts"""
+    return get_embedding_cache().embed_many(texts)
+
+def embed_text_cached(text: str) -> np.ndarray:
+    return embed_texts_cached([text])[0]
@@ -0,0 +1,153 @@
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from services.embedding_cache import embed_texts_cached
+from utils.chunker import iter_chunks, parse_and_chunk
+from utils.parser import iter_pages_cached
+from vector_store.chroma_store import add_many_to_vectorstore, indexed_passage_count, remember_indexed
+
+# Chunks embedded and written to Chroma per call
+WRITE_BATCH_SIZE = 256
+PREVIEW_CHARS = 200
+
+def document_hasher():
+    """Return a hashlib object whose hexdigest is a document id"""
+    return hashlib.blake2b(digest_size=16)
+
+def document_id(data: bytes) -> str:
+    """The content hash of a file, used as its document id"""
+    hasher = document_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+def store_chunks(doc_id: str, name: str, chunks, start: int = 0):
+    """Embed a batch of chunks and write them to the vector store"""
+    indices = range(start, start + len(chunks))
+    add_many_to_vectorstore(
+        [f"{doc_id}:{i}" for i in indices],
+        chunks,
+        embed_texts_cached(chunks),
+        [{"parent": doc_id, "name": name, "chunk": i} for i in indices]
+    )
+
+def index_document(doc_id: str, name: str, source, file_extension: str) -> int:
+    """Parse, chunk, embed and store a document a few pages at a time.
+
+    Chunks are buffered until WRITE_BATCH_SIZE of them are ready, so most
+    files are embedded and written with a single call while very large
+    ones stay bounded in memory. Each write runs on a writer thread while
+    the next pages are being parsed. source is raw bytes, a binary file
+    object or a file path, and doc_id its content hash, which keys the
+    parse cache. Returns the number of chunks stored.
+    """
+    buffered = []
+    chunk_count = 0
+    pending = None
+
+    def flush():
+        nonlocal buffered, chunk_count, pending
+        if pending is not None:
+            pending.result()
+        pending = writer.submit(store_chunks, doc_id, name, buffered, chunk_count)
+        chunk_count += len(buffered)
+        buffered = []
+
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        for chunks in iter_chunks(iter_pages_cached(source, file_extension, doc_id)):
+            buffered.extend(chunks)
+            if len(buffered) >= WRITE_BATCH_SIZE:
+                flush()
+        if buffered:
+            flush()
+
+        if pending is not None:
+            pending.result()
+
+    if chunk_count:
+        remember_indexed(doc_id, chunk_count)
+    return chunk_count
+
+@lru_cache(maxsize=1)
+def get_parse_executor() -> ProcessPoolExecutor:
+    """Worker processes shared by every caller for CPU-bound parsing and chunking"""
+    # spawn rather than fork: the calling process already runs model and server threads
+    return ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+
+def index_files(files: Sequence[Tuple[str, bytes]],
+                progress: Optional[Callable[[str, Optional[float]], None]] = None) -> List[dict]:
+    """Index several in-memory files at once.
+
+    Files are parsed and split into passages in parallel worker processes,
+    then all passages are embedded with one batched encode call and
+    stored with one vector store insert. Files whose content is already
+    indexed are skipped. progress, when given, is called with a status
+    message and the fraction done (None while storing).
+
+    Returns one dict per file, in order, with its name, id, size, status
+    ("indexed", "duplicate", "empty" or "error"), chunk count, a preview
+    of its text and, on error, the error message.
+    """
+    results = []
+    futures = {}
+    seen = set()
+
+    for name, data in files:
+        # The content hash is the document id, so recent re-uploads skip embedding
+        doc_id = document_id(data)
+        chunk_count = indexed_passage_count(doc_id)
+        result = {"name": name, "id": doc_id, "size": len(data), "status": "duplicate",
+                  "chunks": chunk_count or 0, "preview": "", "error": None}
+        results.append(result)
+        if doc_id in seen or chunk_count is not None:
+            continue
+        seen.add(doc_id)
+
+        future = get_parse_executor().submit(parse_and_chunk, data, Path(name).suffix, doc_id)
+        futures[future] = result
+
+    parsed = []
+    total_steps = len(futures) + 1
+    for done, future in enumerate(as_completed(futures), start=1):
+        result = futures[future]
+        try:
+            text, chunks = future.result()
+            if chunks:
+                result["preview"] = text[:PREVIEW_CHARS] + "..." if len(text) > PREVIEW_CHARS else text
+                parsed.append((result, chunks))
+            else:
+                result["status"] = "empty"
+        except Exception as e:
+            result["status"], result["error"] = "error", str(e)
+
+        if progress is not None:
+            progress(f"Parsed {result['name']}", done / total_steps)
+
+    if parsed:
+        if progress is not None:
+            progress("Embedding and storing documents...", None)
+        try:
+            # Embed and store the passages of every document with one call each
+            chunk_ids, all_chunks, metadatas = [], [], []
+            for result, chunks in parsed:
+                doc_id = result["id"]
+                chunk_ids.extend(f"{doc_id}:{n}" for n in range(len(chunks)))
+                metadatas.extend({"parent": doc_id, "name": result["name"], "chunk": n} for n in range(len(chunks)))
+                all_chunks.extend(chunks)
+
+            add_many_to_vectorstore(chunk_ids, all_chunks, embed_texts_cached(all_chunks), metadatas)
+        except Exception as e:
+            for result, _ in parsed:
+                result["status"], result["error"] = "error", str(e)
+        else:
+            for result, chunks in parsed:
+                remember_indexed(result["id"], len(chunks))
+                result["status"], result["chunks"] = "indexed", len(chunks)
+
+    if progress is not None:
+        progress("All files processed", 1.0)
+    return results
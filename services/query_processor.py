@@ -0,0 +1,129 @@
+import asyncio
+import threading
+from collections import defaultdict
+from typing import List, Optional
+
+from services.embedding import embed_texts
+from services.rag import MMR_FETCH_K, RAG_PROMPT, format_passages, get_llm, select_passages
+from vector_store.chroma_store import get_collection
+
+MAX_BATCH_SIZE = 8
+MAX_WAIT_MS = 75
+
+class QueryProcessor:
+    """Answer questions in micro-batches.
+
+    Questions submitted from any thread or event loop are queued on a
+    private event loop running in a background thread. Up to
+    ``max_batch_size`` questions, or whatever arrives within ``max_wait_ms``
+    of the first one, are answered together with one embedding call, one
+    vector store query and one batched LLM request per temperature.
+    Temperature and k travel with each question, and the LLM is looked up
+    per batch, so one processor serves every setting and API key.
+    """
+
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: int = MAX_WAIT_MS):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="query-processor", daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._loop.create_task(self._collect_batches())
+        self._started.set()
+        self._loop.run_forever()
+
+    async def submit(self, query: str, temperature: float = 0.0, k: int = 3) -> str:
+        """Queue a question and wait for its answer; awaitable from any event loop"""
+        future = asyncio.run_coroutine_threadsafe(self._enqueue((query, temperature, k)), self._loop)
+        return await asyncio.wrap_future(future)
+
+    async def _enqueue(self, request) -> str:
+        answer = self._loop.create_future()
+        await self._queue.put((request, answer))
+        return await answer
+
+    async def _collect_batches(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Answer in the background so the next batch can start filling
+            self._loop.create_task(self._process(batch))
+
+    async def _process(self, batch):
+        requests = [request for request, _ in batch]
+        try:
+            answers = await self._answer(requests)
+        except Exception as e:
+            for _, answer in batch:
+                if not answer.done():
+                    answer.set_exception(e)
+            return
+
+        for (_, answer), text in zip(batch, answers):
+            if not answer.done():
+                answer.set_result(text)
+
+    async def _answer(self, requests) -> List[str]:
+        queries = [query for query, _, _ in requests]
+        embeddings = await asyncio.to_thread(embed_texts, queries)
+        results = await asyncio.to_thread(
+            get_collection().query,
+            query_embeddings=embeddings,
+            n_results=max(MMR_FETCH_K, *(k for _, _, k in requests)),
+            include=["documents", "embeddings"]
+        )
+
+        # One batched LLM request per temperature in the batch
+        by_temperature = defaultdict(list)
+        for i, ((query, temperature, k), embedding, docs, doc_embeddings) in enumerate(
+                zip(requests, embeddings, results["documents"], results["embeddings"])):
+            prompt = RAG_PROMPT.format_messages(
+                context=format_passages(select_passages(embedding, docs, doc_embeddings, k)),
+                question=query
+            )
+            by_temperature[temperature].append((i, prompt))
+
+        async def generate(temperature, prompts):
+            llm = get_llm(temperature=temperature)
+            if llm is None:
+                raise LookupError("GOOGLE_API_KEY is not set")
+            return await llm.abatch([prompt for _, prompt in prompts])
+
+        groups = list(by_temperature.items())
+        responses = await asyncio.gather(*(generate(t, prompts) for t, prompts in groups))
+
+        answers = [None] * len(requests)
+        for (_, prompts), group_responses in zip(groups, responses):
+            for (i, _), response in zip(prompts, group_responses):
+                answers[i] = response.content
+        return answers
+
+_processor = None
+_processor_lock = threading.Lock()
+
+def get_query_processor() -> Optional[QueryProcessor]:
+    """Get the process-wide processor, or None when no LLM is configured"""
+    global _processor
+    if get_llm() is None:
+        return None
+
+    with _processor_lock:
+        if _processor is None:
+            _processor = QueryProcessor()
+        return _processor
@@ -1,52 +1,151 @@
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.chains import RetrievalQA
-from langchain_google_genai import ChatGoogleGenerativeAI
+# langchain_google_genai is imported where it is first needed; its
+# dependency tree dominates the import time of this module
+from langchain_core.prompts import ChatPromptTemplate
+
+from services.embedding import embed_texts
+from vector_store.chroma_store import get_collection
 
 import os
+from functools import lru_cache
+from typing import Iterator, List, Optional
 
-# Initialize embedding model
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+import numpy as np
 
-def get_vectorstore():
-    """Get or create the Chroma vector store"""
-    try:
-        return Chroma(
-            collection_name="rag_documents",
-            embedding_function=embedding_model,
-            persist_directory="chroma_data"
-        )
-    except Exception as e:
-        print(f"Error creating vector store: {e}")
+DEFAULT_LLM_MODEL = "gemini-1.5-flash"
+
+# Built once at import instead of per call
+RAG_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "Use the following pieces of context to answer the user's question. "
+     "If you don't know the answer, just say that you don't know, don't try to make up an answer.\n"
+     "----------------\n"
+     "{context}"),
+    ("human", "{question}")
+])
+
+# Retrieval fetches MMR_FETCH_K candidates and keeps k that are relevant but
+# not redundant; near-duplicate passages only add prompt tokens
+MMR_FETCH_K = 20
+MMR_LAMBDA = 0.5
+# Longest passage put into the prompt, in characters
+MAX_PASSAGE_CHARS = 1500
+
+def format_passages(passages) -> str:
+    return "\n\n".join(passage[:MAX_PASSAGE_CHARS] for passage in passages)
+
+def mmr_select(query_embedding, candidate_embeddings, k: int, lambda_mult: float = MMR_LAMBDA) -> List[int]:
+    """Indices of k candidates chosen by maximal marginal relevance.
+
+    Embeddings are L2-normalized, so dot products are cosine similarities.
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if len(candidates) == 0:
+        return []
+    relevance = candidates @ np.asarray(query_embedding, dtype=np.float32)
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    while len(selected) < min(k, len(candidates)):
+        redundancy = similarity[:, selected].max(axis=1)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        selected.append(int(np.argmax(scores)))
+    return selected
+
+def select_passages(query_embedding, documents, embeddings, k: int) -> List[str]:
+    """Apply MMR to one query's candidates from collection.query"""
+    return [documents[i] for i in mmr_select(query_embedding, embeddings, k)]
+
+@lru_cache(maxsize=8)
+def _create_llm(google_api_key: str, model: str, temperature: float):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=model,
+        google_api_key=google_api_key,
+        temperature=temperature
+    )
+
+def get_llm(model: str = DEFAULT_LLM_MODEL, temperature: float = 0.0):
+    """Get the shared Gemini chat model, or None when GOOGLE_API_KEY is missing"""
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
         return None
+    return _create_llm(google_api_key, model, temperature)
 
-def get_rag_chain():
-    """Get the RAG chain for question answering"""
-    try:
-        vectorstore = get_vectorstore()
-        if vectorstore is None:
-            return None
+@lru_cache(maxsize=8)
+def _build_rag_chain(google_api_key: str, model: str, temperature: float, k: int):
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+    # Keyed on the API key too, so a rotated key builds a fresh client.
+    # Errors propagate so that failed builds are never cached.
+    # Retrieval is retrieve_context(), which looks the collection up by name
+    # per question, so the cached chain survives rebuild_index()
+    retriever = RunnableLambda(lambda question: retrieve_context(question, k))
 
+    llm = _create_llm(google_api_key, model, temperature)
+
+    # Takes the question string and yields the answer string; supports invoke() and stream()
+    rag_chain = (
+        {"context": retriever, "question": RunnablePassthrough()}
+        | RAG_PROMPT
+        | llm
+        | StrOutputParser()
+    )
+    return rag_chain
+
+def get_rag_chain(model: str = DEFAULT_LLM_MODEL, temperature: float = 0.0, k: int = 3):
+    """Get the RAG chain for question answering, retrieving k passages per question"""
+    try:
         # Check if Google API key is available
         google_api_key = os.getenv("GOOGLE_API_KEY")
         if not google_api_key:
             print("Warning: GOOGLE_API_KEY not found. RAG functionality will be limited.")
             return None
 
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=google_api_key,
-            temperature=0
-        )
-
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            retriever=retriever,
-            chain_type="stuff"
-        )
-        return qa_chain
+        return _build_rag_chain(google_api_key, model, temperature, k)
     except Exception as e:
         print(f"Error creating RAG chain: {e}")
         return None
+
+def retrieve_context(question: str, k: int = 3, query_embedding: Optional[np.ndarray] = None) -> str:
+    """Join k relevant, mutually diverse passages for the question.
+
+    Pass query_embedding when the caller has already embedded the question.
+    """
+    if query_embedding is None:
+        query_embedding = embed_texts([question])[0]
+    query_embedding = np.asarray(query_embedding, dtype=np.float32)
+    results = get_collection().query(
+        query_embeddings=query_embedding[np.newaxis, :],
+        n_results=max(MMR_FETCH_K, k),
+        include=["documents", "embeddings"]
+    )
+    return format_passages(
+        select_passages(query_embedding, results["documents"][0], results["embeddings"][0], k)
+    )
+
+def _answer_messages(question: str, model: str, temperature: float, k: int, query_embedding):
+    llm = get_llm(model=model, temperature=temperature)
+    if llm is None:
+        raise LookupError("GOOGLE_API_KEY is not set")
+    context = retrieve_context(question, k, query_embedding)
+    return llm, RAG_PROMPT.format_messages(context=context, question=question)
+
+def answer(question: str, model: str = DEFAULT_LLM_MODEL, temperature: float = 0.0, k: int = 3,
+           query_embedding: Optional[np.ndarray] = None) -> str:
+    """Answer a question with one retrieval and one LLM call.
+
+    Same prompt and retrieval as the RAG chain, without walking the
+    Runnable graph and its callbacks on every question.
+    """
+    llm, messages = _answer_messages(question, model, temperature, k, query_embedding)
+    return llm.invoke(messages).content
+
+def stream_answer(question: str, model: str = DEFAULT_LLM_MODEL, temperature: float = 0.0,
+                  k: int = 3, query_embedding: Optional[np.ndarray] = None) -> Iterator[str]:
+    """Like answer(), but yields the text as the model produces it"""
+    llm, messages = _answer_messages(question, model, temperature, k, query_embedding)
+    for chunk in llm.stream(messages):
+        yield chunk.content
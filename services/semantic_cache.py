@@ -0,0 +1,125 @@
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+CACHE_PATH = "cache.sqlite"
+MAX_CACHE_SIZE = 5000
+DEFAULT_THRESHOLD = 0.92
+
+class SemanticCache:
+    """Answer cache matched on query-embedding similarity.
+
+    Entries live in memory as one matrix of L2-normalized query embeddings
+    (so a matrix-vector product yields cosine similarities) and are
+    persisted to SQLite so they survive restarts. Beyond ``max_size``
+    entries the least recently used ones are evicted.
+
+    Every entry records the ``generation`` it was answered against,
+    typically vector_store.chroma_store.store_version(). A lookup or
+    insert with a different generation drops all entries, so answers
+    never outlive the documents they were based on.
+
+    Entries also record a ``scope`` naming the settings they were answered
+    with, such as temperature and retrieval depth, and a lookup only
+    matches entries of the same scope.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_size: int = MAX_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(semantic_cache)")}
+        if columns and "scope" not in columns:
+            # Written before entries were scoped; cached answers are disposable
+            self._conn.execute("DROP TABLE semantic_cache")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                id INTEGER PRIMARY KEY,
+                query TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                generation TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        rows = self._conn.execute(
+            "SELECT id, embedding, answer, scope, generation FROM semantic_cache ORDER BY id"
+        ).fetchall()
+        self._ids = [row[0] for row in rows]
+        self._answers = [row[2] for row in rows]
+        self._scopes = [row[3] for row in rows]
+        self._generation = rows[-1][4] if rows else None
+        self._matrix = (
+            np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            if rows else None
+        )
+
+    def _set_generation(self, generation: str):
+        if generation != self._generation:
+            self._conn.execute("DELETE FROM semantic_cache")
+            self._conn.commit()
+            self._ids, self._answers, self._scopes, self._matrix = [], [], [], None
+            self._generation = generation
+
+    def lookup(self, embedding: np.ndarray, threshold: float = DEFAULT_THRESHOLD,
+               generation: str = "", scope: str = "") -> Optional[str]:
+        """Return the cached answer of the most similar past query in scope, if it clears threshold"""
+        with self._lock:
+            self._set_generation(generation)
+            if self._matrix is None:
+                return None
+
+            similarities = self._matrix @ np.asarray(embedding, dtype=np.float32)
+            similarities[np.asarray(self._scopes) != scope] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] < threshold:
+                return None
+
+            self._conn.execute(
+                "UPDATE semantic_cache SET last_used = ? WHERE id = ?",
+                (time.time(), self._ids[best])
+            )
+            self._conn.commit()
+            return self._answers[best]
+
+    def add(self, query: str, embedding: np.ndarray, answer: str, generation: str = "", scope: str = ""):
+        """Store an answer, evicting the least recently used entry when full"""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            self._set_generation(generation)
+            cursor = self._conn.execute(
+                "INSERT INTO semantic_cache (query, embedding, answer, scope, generation, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (query, vector.tobytes(), answer, scope, generation, time.time())
+            )
+            self._ids.append(cursor.lastrowid)
+            self._answers.append(answer)
+            self._scopes.append(scope)
+            self._matrix = vector if self._matrix is None else np.vstack([self._matrix, vector])
+
+            if len(self._ids) > self.max_size:
+                (evicted,) = self._conn.execute(
+                    "SELECT id FROM semantic_cache ORDER BY last_used LIMIT 1"
+                ).fetchone()
+                self._conn.execute("DELETE FROM semantic_cache WHERE id = ?", (evicted,))
+                index = self._ids.index(evicted)
+                del self._ids[index]
+                del self._answers[index]
+                del self._scopes[index]
+                self._matrix = np.delete(self._matrix, index, axis=0)
+
+            self._conn.commit()
+
+@lru_cache(maxsize=1)
+def get_semantic_cache() -> SemanticCache:
+    """Get the process-wide semantic cache"""
+    return SemanticCache()
@@ -1,24 +1,16 @@
 import streamlit as st
+import html
+import asyncio
 import os
 import time
-from pathlib import Path
-from typing import Optional
-import uuid
-from datetime import datetime
+from types import SimpleNamespace
 
 # Import local modules
-from utils.parser import parse_file
-from services.embedding import embed_text
-from vector_store.chroma_store import add_to_vectorstore, collection
-# Import RAG functionality with error handling
-try:
-    from services.rag import get_rag_chain
-    RAG_AVAILABLE = True
-except ImportError as e:
-    st.warning(f"RAG functionality not available: {e}")
-    RAG_AVAILABLE = False
-    def get_rag_chain():
-        return None
+from services.embedding import embed_texts
+from streamlit_common import (
+    UPLOAD_ERROR_HTML, UPLOAD_SUCCESS_HTML, get_document_stats, load_css, upload_documents
+)
+from vector_store.chroma_store import store_version
 
 # Page configuration
 st.set_page_config(
@@ -28,147 +20,40 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better styling
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 3rem;
-        font-weight: bold;
-        text-align: center;
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        margin-bottom: 2rem;
-    }
-
-    .feature-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 1.5rem;
-        border-radius: 10px;
-        color: white;
-        margin: 1rem 0;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-    }
-
-    .upload-area {
-        border: 2px dashed #667eea;
-        border-radius: 10px;
-        padding: 2rem;
-        text-align: center;
-        background-color: #f8f9ff;
-        margin: 1rem 0;
-    }
-
-    .chat-message {
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 0.5rem 0;
-        max-width: 80%;
-    }
-
-    .user-message {
-        background-color: #e3f2fd;
-        margin-left: auto;
-        text-align: right;
-    }
-
-    .assistant-message {
-        background-color: #f5f5f5;
-        margin-right: auto;
-    }
-
-    .sidebar-info {
-        background-color: #f0f2f6;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-    }
-
-    .success-message {
-        background-color: #d4edda;
-        color: #155724;
-        padding: 1rem;
-        border-radius: 5px;
-        border: 1px solid #c3e6cb;
-        margin: 1rem 0;
-    }
-
-    .error-message {
-        background-color: #f8d7da;
-        color: #721c24;
-        padding: 1rem;
-        border-radius: 5px;
-        border: 1px solid #f5c6cb;
-        margin: 1rem 0;
-    }
-</style>
-""", unsafe_allow_html=True)
-
 # Initialize session state
 if 'uploaded_documents' not in st.session_state:
     st.session_state.uploaded_documents = []
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
-if 'rag_chain' not in st.session_state:
-    st.session_state.rag_chain = None
-
-def initialize_rag_chain():
-    """Initialize the RAG chain if not already done"""
-    if not RAG_AVAILABLE:
-        return False
-
-    if st.session_state.rag_chain is None:
-        try:
-            st.session_state.rag_chain = get_rag_chain()
-            return st.session_state.rag_chain is not None
-        except Exception as e:
-            st.error(f"Failed to initialize RAG chain: {str(e)}")
-            return False
-    return True
 
-def upload_document(uploaded_file):
-    """Process and upload a document"""
-    try:
-        # Read file content
-        file_bytes = uploaded_file.read()
-        file_extension = Path(uploaded_file.name).suffix
-
-        # Parse the file
-        text = parse_file(file_bytes, file_extension)
-
-        if not text.strip():
-            st.error("The uploaded file appears to be empty or could not be parsed.")
-            return False
-
-        # Generate embedding and store
-        doc_id = str(uuid.uuid4())
-        embedding = embed_text(text)
-        add_to_vectorstore(doc_id, text, embedding)
-
-        # Add to session state
-        doc_info = {
-            'id': doc_id,
-            'name': uploaded_file.name,
-            'size': len(file_bytes),
-            'upload_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'preview': text[:200] + "..." if len(text) > 200 else text
-        }
-        st.session_state.uploaded_documents.append(doc_info)
-
-        return True
-    except Exception as e:
-        st.error(f"Error uploading document: {str(e)}")
-        return False
-
-def get_document_stats():
-    """Get statistics about uploaded documents"""
+@st.cache_resource(show_spinner="Loading chat services...")
+def _import_rag_services():
+    from services.rag import answer, get_llm, stream_answer
+    from services.query_processor import get_query_processor
+    from services.semantic_cache import get_semantic_cache
+    return SimpleNamespace(
+        answer=answer,
+        get_llm=get_llm,
+        stream_answer=stream_answer,
+        get_query_processor=get_query_processor,
+        get_semantic_cache=get_semantic_cache
+    )
+
+def load_rag_services():
+    """Import the chat stack once per process, when the chat tab first renders.
+
+    The upload tab is drawn before this runs, so it never waits on the
+    LangChain imports. Returns None when they are not installed.
+    """
     try:
-        count = collection.count()
-        return count
-    except:
-        return len(st.session_state.uploaded_documents)
+        return _import_rag_services()
+    except ImportError as e:
+        st.warning(f"RAG functionality not available: {e}")
+        return None
 
 def main():
+    st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
+
     # Header
     st.markdown('<h1 class="main-header">📚 IntelliDoc AI Assistant</h1>', unsafe_allow_html=True)
     st.markdown('<p style="text-align: center; font-size: 1.2rem; color: #666;">Your intelligent document companion powered by AI</p>', unsafe_allow_html=True)
@@ -182,7 +67,7 @@ def main():
         st.markdown(f"""
         <div class="sidebar-info">
             <h4>📊 Document Statistics</h4>
-            <p><strong>Total Documents:</strong> {doc_count}</p>
+            <p><strong>Indexed Passages:</strong> {doc_count}</p>
             <p><strong>Session Uploads:</strong> {len(st.session_state.uploaded_documents)}</p>
         </div>
         """, unsafe_allow_html=True)
@@ -191,6 +76,11 @@ def main():
         st.markdown("### ⚙️ Settings")
         max_docs_to_retrieve = st.slider("Max documents to retrieve", 1, 10, 3)
         temperature = st.slider("Response creativity", 0.0, 1.0, 0.0, 0.1)
+        cache_threshold = st.slider(
+            "Answer cache similarity",
+            0.80, 1.00, 0.92, 0.01,
+            help="Questions at least this similar to an earlier one reuse its answer instead of calling Gemini"
+        )
 
         # Clear chat history
         if st.button("🗑️ Clear Chat History"):
@@ -227,23 +117,9 @@ def main():
             progress_bar = st.progress(0)
             status_text = st.empty()
 
-            for i, uploaded_file in enumerate(uploaded_files):
-                status_text.text(f"Processing {uploaded_file.name}...")
-
-                if upload_document(uploaded_file):
-                    st.markdown(f"""
-                    <div class="success-message">
-                        ✅ Successfully uploaded: <strong>{uploaded_file.name}</strong>
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div class="error-message">
-                        ❌ Failed to upload: <strong>{uploaded_file.name}</strong>
-                    </div>
-                    """, unsafe_allow_html=True)
-
-                progress_bar.progress((i + 1) / len(uploaded_files))
+            for file_name, success in upload_documents(uploaded_files, progress_bar, status_text):
+                template = UPLOAD_SUCCESS_HTML if success else UPLOAD_ERROR_HTML
+                st.markdown(template.format(name=html.escape(file_name)), unsafe_allow_html=True)
 
             status_text.text("✅ All files processed!")
             time.sleep(1)
@@ -254,15 +130,21 @@ def main():
         st.markdown("## 💬 Chat with Your Documents")
 
         # Check if RAG is available
-        if not RAG_AVAILABLE:
+        rag = load_rag_services()
+        if rag is None:
             st.warning("🔧 Chat functionality requires additional setup:")
             st.info("1. Install: `pip install langchain-community`")
             st.info("2. Add Google API key to .env file")
             st.info("3. Restart the application")
             return
 
-        # Initialize RAG chain
-        if not initialize_rag_chain():
+        # Answers come from stream_answer/answer, which only need the LLM
+        try:
+            llm = rag.get_llm(temperature=temperature)
+        except Exception as e:
+            st.error(f"Failed to initialize the chat model: {str(e)}")
+            return
+        if llm is None:
             st.error("Cannot initialize chat system. Please check your configuration.")
             st.info("Make sure you have:")
             st.info("- Added GOOGLE_API_KEY to your .env file")
@@ -270,57 +152,69 @@ def main():
             return
 
         # Display chat history
-        chat_container = st.container()
-        with chat_container:
-            for message in st.session_state.chat_history:
-                if message['role'] == 'user':
-                    st.markdown(f"""
-                    <div class="chat-message user-message">
-                        <strong>You:</strong> {message['content']}
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div class="chat-message assistant-message">
-                        <strong>🤖 Assistant:</strong> {message['content']}
-                    </div>
-                    """, unsafe_allow_html=True)
-
-        # Chat input
-        user_question = st.text_input(
-            "Ask a question about your documents:",
-            placeholder="e.g., What are the main topics discussed in the uploaded documents?",
-            key="chat_input"
-        )
+        for message in st.session_state.chat_history:
+            with st.chat_message(message['role']):
+                st.markdown(message['content'])
 
-        col1, col2 = st.columns([1, 4])
-        with col1:
-            ask_button = st.button("🚀 Ask", type="primary")
+        user_question = st.chat_input("Ask a question about your documents...")
 
-        if ask_button and user_question:
+        if user_question:
             # Add user message to history
             st.session_state.chat_history.append({
                 'role': 'user',
                 'content': user_question
             })
+            with st.chat_message('user'):
+                st.markdown(user_question)
 
-            # Get response from RAG chain
-            with st.spinner("🤔 Thinking..."):
+            with st.chat_message('assistant'):
                 try:
-                    result = st.session_state.rag_chain.invoke({"query": user_question})
-                    response = result.get("result", str(result))
-                    st.session_state.chat_history.append({
-                        'role': 'assistant',
-                        'content': response
-                    })
+                    # Near-duplicate questions are answered from the semantic cache
+                    cache = rag.get_semantic_cache()
+                    # Questions bypass the passage embedding cache; the one
+                    # vector serves both the cache lookup and retrieval
+                    query_embedding = embed_texts([user_question])[0]
+                    # Answers only carry over between questions asked of the same
+                    # store with the same creativity and retrieval depth
+                    generation = store_version()
+                    scope = f"{temperature}:{max_docs_to_retrieve}"
+                    response = cache.lookup(query_embedding, cache_threshold, generation=generation, scope=scope)
+
+                    if response is not None:
+                        st.markdown(response)
+                    else:
+                        streamed = False
+
+                        def tokens():
+                            nonlocal streamed
+                            for token in rag.stream_answer(user_question, temperature=temperature, k=max_docs_to_retrieve, query_embedding=query_embedding):
+                                streamed = True
+                                yield token
+
+                        try:
+                            # Show Gemini's tokens as they arrive
+                            response = st.write_stream(tokens())
+                        except Exception:
+                            # Once part of the answer is on screen, report the error
+                            # instead of answering a second time below it
+                            if streamed:
+                                raise
+                            # Non-streaming fallback through the shared batching processor
+                            processor = rag.get_query_processor()
+                            if processor is not None:
+                                response = asyncio.run(processor.submit(user_question, temperature=temperature, k=max_docs_to_retrieve))
+                            else:
+                                response = rag.answer(user_question, temperature=temperature, k=max_docs_to_retrieve, query_embedding=query_embedding)
+                            st.markdown(response)
+                        cache.add(user_question, query_embedding, response, generation=generation, scope=scope)
                 except Exception as e:
-                    error_msg = f"Sorry, I encountered an error: {str(e)}"
-                    st.session_state.chat_history.append({
-                        'role': 'assistant',
-                        'content': error_msg
-                    })
+                    response = f"Sorry, I encountered an error: {str(e)}"
+                    st.markdown(response)
 
-            st.rerun()
+            st.session_state.chat_history.append({
+                'role': 'assistant',
+                'content': response
+            })
 
     with tab3:
         st.markdown("## 📋 Document Library")
@@ -336,6 +230,7 @@ def main():
                         st.markdown(f"**Document ID:** `{doc['id']}`")
                         st.markdown(f"**File Size:** {doc['size']:,} bytes")
                         st.markdown(f"**Upload Time:** {doc['upload_time']}")
+                        st.markdown(f"**Passages:** {doc.get('chunks', 1)}")
 
                     with col2:
                         st.markdown("**Preview:**")
@@ -343,10 +238,11 @@ def main():
         else:
             st.info("📭 No documents uploaded yet. Go to the Upload tab to add some documents!")
 
-        # Show total document count from vector store
-        total_docs = get_document_stats()
-        if total_docs > len(st.session_state.uploaded_documents):
-            st.info(f"💡 There are {total_docs - len(st.session_state.uploaded_documents)} additional documents in the database from previous sessions.")
+        # Show passages in the vector store that were not uploaded in this session
+        total_chunks = get_document_stats()
+        session_chunks = sum(doc.get('chunks', 1) for doc in st.session_state.uploaded_documents)
+        if total_chunks > session_chunks:
+            st.info(f"💡 There are {total_chunks - session_chunks} additional passages in the database from previous sessions.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,70 @@
+import streamlit as st
+from datetime import datetime
+from pathlib import Path
+
+from services.embedding import get_model
+from services.ingest import index_files
+from vector_store.chroma_store import get_collection
+
+# HTML fragments rendered on every rerun
+UPLOAD_SUCCESS_HTML = '<div class="success-message">✅ Successfully uploaded: <strong>{name}</strong></div>'
+UPLOAD_ERROR_HTML = '<div class="error-message">❌ Failed to upload: <strong>{name}</strong></div>'
+
+@st.cache_resource
+def load_css():
+    """Read the shared stylesheet once per process"""
+    return (Path(__file__).parent / "static" / "style.css").read_text(encoding="utf-8")
+
+@st.cache_resource(show_spinner="Loading embedding model...")
+def load_embedding_model():
+    """Load the embedding model once per process"""
+    return get_model()
+
+def upload_documents(uploaded_files, progress_bar, status_text):
+    """Process and upload documents through services.ingest.index_files.
+
+    Indexed files are added to the session's document list. Returns a
+    list of (file name, success) in upload order.
+    """
+    load_embedding_model()
+
+    def progress(message, fraction):
+        status_text.text(message)
+        if fraction is not None:
+            progress_bar.progress(fraction)
+
+    status_text.text(f"Processing {len(uploaded_files)} file(s)...")
+    results = index_files([(uploaded_file.name, uploaded_file.read()) for uploaded_file in uploaded_files], progress)
+
+    for result in results:
+        if result['status'] == 'duplicate':
+            st.info(f"{result['name']} is already indexed.")
+        elif result['status'] == 'empty':
+            st.error(f"{result['name']} appears to be empty or could not be parsed.")
+        elif result['status'] == 'error':
+            st.error(f"Error processing {result['name']}: {result['error']}")
+        else:
+            st.session_state.uploaded_documents.append({
+                'id': result['id'],
+                'name': result['name'],
+                'size': result['size'],
+                'chunks': result['chunks'],
+                'upload_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'preview': result['preview']
+            })
+
+    if any(result['status'] == 'indexed' for result in results):
+        cached_passage_count.clear()
+    return [(result['name'], result['status'] in ('indexed', 'duplicate')) for result in results]
+
+@st.cache_data(ttl=5, show_spinner=False)
+def cached_passage_count():
+    """Passage count, cached briefly because every rerun asks for it"""
+    return get_collection().count()
+
+def get_document_stats():
+    """Get statistics about uploaded documents"""
+    try:
+        return cached_passage_count()
+    except:
+        return len(st.session_state.uploaded_documents)
@@ -1,14 +1,10 @@
 import streamlit as st
+import html
 import os
 import time
-from pathlib import Path
-import uuid
-from datetime import datetime
 
 # Import local modules
-from utils.parser import parse_file
-from services.embedding import embed_text
-from vector_store.chroma_store import add_to_vectorstore, collection
+from streamlit_common import UPLOAD_ERROR_HTML, UPLOAD_SUCCESS_HTML, get_document_stats, load_css, upload_documents
 
 # Page configuration
 st.set_page_config(
@@ -18,102 +14,13 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better styling
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 3rem;
-        font-weight: bold;
-        text-align: center;
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        margin-bottom: 2rem;
-    }
-
-    .feature-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 1.5rem;
-        border-radius: 10px;
-        color: white;
-        margin: 1rem 0;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-    }
-
-    .success-message {
-        background-color: #d4edda;
-        color: #155724;
-        padding: 1rem;
-        border-radius: 5px;
-        border: 1px solid #c3e6cb;
-        margin: 1rem 0;
-    }
-
-    .error-message {
-        background-color: #f8d7da;
-        color: #721c24;
-        padding: 1rem;
-        border-radius: 5px;
-        border: 1px solid #f5c6cb;
-        margin: 1rem 0;
-    }
-
-    .sidebar-info {
-        background-color: #f0f2f6;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-    }
-</style>
-""", unsafe_allow_html=True)
-
 # Initialize session state
 if 'uploaded_documents' not in st.session_state:
     st.session_state.uploaded_documents = []
 
-def upload_document(uploaded_file):
-    """Process and upload a document"""
-    try:
-        # Read file content
-        file_bytes = uploaded_file.read()
-        file_extension = Path(uploaded_file.name).suffix
-
-        # Parse the file
-        text = parse_file(file_bytes, file_extension)
-
-        if not text.strip():
-            st.error("The uploaded file appears to be empty or could not be parsed.")
-            return False
-
-        # Generate embedding and store
-        doc_id = str(uuid.uuid4())
-        embedding = embed_text(text)
-        add_to_vectorstore(doc_id, text, embedding)
-
-        # Add to session state
-        doc_info = {
-            'id': doc_id,
-            'name': uploaded_file.name,
-            'size': len(file_bytes),
-            'upload_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'preview': text[:200] + "..." if len(text) > 200 else text
-        }
-        st.session_state.uploaded_documents.append(doc_info)
-
-        return True
-    except Exception as e:
-        st.error(f"Error uploading document: {str(e)}")
-        return False
-
-def get_document_stats():
-    """Get statistics about uploaded documents"""
-    try:
-        count = collection.count()
-        return count
-    except:
-        return len(st.session_state.uploaded_documents)
-
 def main():
+    st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
+
     # Header
     st.markdown('<h1 class="main-header">📚 IntelliDoc AI Assistant</h1>', unsafe_allow_html=True)
     st.markdown('<p style="text-align: center; font-size: 1.2rem; color: #666;">Your intelligent document companion powered by AI</p>', unsafe_allow_html=True)
@@ -127,7 +34,7 @@ def main():
         st.markdown(f"""
         <div class="sidebar-info">
             <h4>📊 Document Statistics</h4>
-            <p><strong>Total Documents:</strong> {doc_count}</p>
+            <p><strong>Indexed Passages:</strong> {doc_count}</p>
             <p><strong>Session Uploads:</strong> {len(st.session_state.uploaded_documents)}</p>
         </div>
         """, unsafe_allow_html=True)
@@ -166,23 +73,9 @@ def main():
             progress_bar = st.progress(0)
             status_text = st.empty()
 
-            for i, uploaded_file in enumerate(uploaded_files):
-                status_text.text(f"Processing {uploaded_file.name}...")
-
-                if upload_document(uploaded_file):
-                    st.markdown(f"""
-                    <div class="success-message">
-                        ✅ Successfully uploaded: <strong>{uploaded_file.name}</strong>
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div class="error-message">
-                        ❌ Failed to upload: <strong>{uploaded_file.name}</strong>
-                    </div>
-                    """, unsafe_allow_html=True)
-
-                progress_bar.progress((i + 1) / len(uploaded_files))
+            for file_name, success in upload_documents(uploaded_files, progress_bar, status_text):
+                template = UPLOAD_SUCCESS_HTML if success else UPLOAD_ERROR_HTML
+                st.markdown(template.format(name=html.escape(file_name)), unsafe_allow_html=True)
 
             status_text.text("✅ All files processed!")
             time.sleep(1)
@@ -203,6 +96,7 @@ def main():
                         st.markdown(f"**Document ID:** `{doc['id']}`")
                         st.markdown(f"**File Size:** {doc['size']:,} bytes")
                         st.markdown(f"**Upload Time:** {doc['upload_time']}")
+                        st.markdown(f"**Passages:** {doc.get('chunks', 1)}")
 
                     with col2:
                         st.markdown("**Preview:**")
@@ -210,10 +104,11 @@ def main():
         else:
             st.info("📭 No documents uploaded yet. Go to the Upload tab to add some documents!")
 
-        # Show total document count from vector store
-        total_docs = get_document_stats()
-        if total_docs > len(st.session_state.uploaded_documents):
-            st.info(f"💡 There are {total_docs - len(st.session_state.uploaded_documents)} additional documents in the database from previous sessions.")
+        # Show passages in the vector store that were not uploaded in this session
+        total_chunks = get_document_stats()
+        session_chunks = sum(doc.get('chunks', 1) for doc in st.session_state.uploaded_documents)
+        if total_chunks > session_chunks:
+            st.info(f"💡 There are {total_chunks - session_chunks} additional passages in the database from previous sessions.")
 
     with tab3:
         st.markdown("## ℹ️ About IntelliDoc")
@@ -263,7 +158,7 @@ def main():
         col1, col2 = st.columns(2)
 
         with col1:
-            st.metric("Documents Processed", get_document_stats())
+            st.metric("Passages Indexed", get_document_stats())
             st.metric("Session Uploads", len(st.session_state.uploaded_documents))
 
         with col2:
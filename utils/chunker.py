@@ -0,0 +1,43 @@
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from utils.parser import iter_pages, iter_pages_cached
+
+# MiniLM truncates its input after 256 word pieces, roughly 1000 characters of
+# English text, so larger chunks would only be embedded by their prefix
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+# Pages joined and split together, so passages can span page breaks
+PAGES_PER_BATCH = 4
+
+_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+def chunk_text(text: str) -> List[str]:
+    """Split text into overlapping passages on paragraph, line and word boundaries"""
+    return _splitter.split_text(text)
+
+def iter_chunks(pages: Iterable[str]) -> Iterator[List[str]]:
+    """Split pages into passages PAGES_PER_BATCH pages at a time.
+
+    Yields the passages of each group of pages. Every ingest path goes
+    through here, so a document always gets the same passage ids.
+    """
+    pages = iter(pages)
+    while batch := list(islice(pages, PAGES_PER_BATCH)):
+        yield chunk_text("\n".join(batch))
+
+def parse_and_chunk(file_bytes: bytes, file_extension: str,
+                    content_hash: Optional[str] = None) -> Tuple[str, List[str]]:
+    """Parse a file and split it into passages, returning (text, chunks).
+
+    Module-level so it can be submitted to a process pool. With a
+    content_hash the parsed pages are memoized on disk.
+    """
+    if content_hash is None:
+        pages = list(iter_pages(file_bytes, file_extension))
+    else:
+        pages = list(iter_pages_cached(file_bytes, file_extension, content_hash))
+    chunks = [chunk for batch in iter_chunks(pages) for chunk in batch]
+    return "\n".join(pages), chunks
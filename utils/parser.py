@@ -1,17 +1,293 @@
 import fitz  # PyMuPDF
+import codecs
 import io
+import multiprocessing
+import os
+import threading
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Union
 
-def parse_file(file_bytes: bytes, file_extension: str) -> str:
-    if file_extension == ".pdf":
-        return parse_pdf(file_bytes)
-    elif file_extension == ".txt":
-        return file_bytes.decode("utf-8")
+# Raw bytes, a binary file object, or the path of a file on disk
+Source = Union[bytes, BinaryIO, str, os.PathLike]
+
+# Parsed page texts keyed by content hash, shared by every process on the host
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", "cache/parse")
+PARSE_CACHE_SIZE_LIMIT = 1 << 30
+
+# Pages of the most recently parsed documents, keyed by content hash and
+# extension; documents longer than MEMORY_CACHE_MAX_CHARS are left to the
+# disk cache, so the memory cache holds at most SIZE * MAX_CHARS characters
+MEMORY_CACHE_SIZE = 32
+MEMORY_CACHE_MAX_CHARS = 1 << 20
+_parsed = OrderedDict()
+_parsed_lock = threading.Lock()
+
+# PDFs on disk with at least this many pages are extracted across worker
+# processes, PAGES_PER_TASK pages per task; smaller ones are extracted
+# serially since worker startup would dominate
+PARALLEL_MIN_PAGES = 8
+PAGES_PER_TASK = 4
+
+# PDF documents currently open in this thread, keyed by the content hash of
+# their bytes or else the bytes object itself; MuPDF documents must not be
+# shared between threads
+_open_docs = threading.local()
+
+def _as_stream(source: Source):
+    """PyMuPDF opens bytes and BytesIO directly; other file objects are read once"""
+    if isinstance(source, (bytes, bytearray, io.BytesIO)):
+        return source
+    return source.read()
+
+def _is_path(source: Source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+@contextmanager
+def open_pdf(source: Source, content_hash: Optional[str] = None):
+    """Open a PDF, reusing a document already open for the same bytes.
+
+    While any caller in this thread still holds a document opened from
+    some bytes, opening the same bytes again reuses it instead of parsing
+    the xref table and page tree again. Documents are matched by
+    content_hash when the caller already has one, otherwise by the
+    identity of the bytes object, so the bytes are never hashed here.
+    Documents are only weakly referenced, so one is freed as soon as no
+    caller holds it. Paths are opened anew each time.
+    """
+    data = source if _is_path(source) else _as_stream(source)
+    if isinstance(data, io.BytesIO):
+        data = data.getvalue()
+    if _is_path(data):
+        # A path lets MuPDF read pages from the file on demand instead of
+        # holding the whole document in memory
+        with fitz.open(data) as doc:
+            yield doc
+        return
+
+    docs = getattr(_open_docs, "docs", None)
+    if docs is None:
+        docs = _open_docs.docs = weakref.WeakValueDictionary()
+    # The open document references its bytes, so their id is not reused while it is cached
+    key = content_hash if content_hash is not None else id(data)
+    doc = docs.get(key)
+    if doc is None:
+        doc = docs[key] = fitz.open(stream=data, filetype="pdf")
+    # Not closed here, since other callers may still be using it
+    yield doc
+
+def get_pdf_metadata(source: Source, content_hash: Optional[str] = None) -> dict:
+    """Return the PDF's document information (title, author, ...) and page count"""
+    with open_pdf(source, content_hash) as doc:
+        return dict(doc.metadata or {}, page_count=doc.page_count)
+
+def get_page_text(source: Source, page_number: int, content_hash: Optional[str] = None) -> str:
+    with open_pdf(source, content_hash) as doc:
+        return doc[page_number].get_text("text")
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16")
+)
+# File objects are decoded this many bytes at a time
+DECODE_CHUNK_SIZE = 1024 * 1024
+
+def _sniff_encoding(head: bytes) -> str:
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    return "utf-8"
+
+def _decode_text(source: Source) -> str:
+    """Decode text by its BOM, defaulting to UTF-8; undecodable bytes become U+FFFD.
+
+    Bytes are decoded in one pass. File objects are decoded incrementally,
+    so only one chunk of raw bytes is held at a time.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return source.decode(_sniff_encoding(source[:3]), errors="replace")
+    if _is_path(source):
+        with open(source, "rb") as f:
+            return _decode_text(f)
+
+    head = source.read(3)
+    decoder = codecs.getincrementaldecoder(_sniff_encoding(head))(errors="replace")
+    parts = [decoder.decode(head)]
+    while chunk := source.read(DECODE_CHUNK_SIZE):
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+def parse_file(source: Source, file_extension: str) -> str:
+    """Extract the text of a file"""
+    # Unknown extensions parse to no text
+    handler = _HANDLERS.get(file_extension.lower())
+    return handler(source) if handler is not None else ""
+
+def iter_pages(source: Source, file_extension: str, content_hash: Optional[str] = None) -> Iterator[str]:
+    """Yield the text of a file page by page (a TXT file is a single page)"""
+    if file_extension.lower() == ".pdf":
+        yield from iter_pdf_pages(source, content_hash)
     else:
-        return ""
-
-def parse_pdf(file_bytes: bytes) -> str:
-    text = ""
-    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-        for page in doc:
-            text += page.get_text()
-    return text
+        yield parse_file(source, file_extension)
+
+def iter_pdf_pages(source: Source, content_hash: Optional[str] = None) -> Iterator[str]:
+    """Yield page texts in order while holding only a few pages in memory.
+
+    Large PDFs given by path are extracted across worker processes, a few
+    page ranges ahead of the caller. Everything else, and any call already
+    running in a worker process, is extracted serially one page at a time.
+    """
+    with open_pdf(source, content_hash) as doc:
+        page_count = doc.page_count
+        parallel = (
+            _is_path(source) and page_count >= PARALLEL_MIN_PAGES
+            and (os.cpu_count() or 1) > 1 and multiprocessing.parent_process() is None
+        )
+        if not parallel:
+            for page in doc:
+                yield page.get_text("text")
+            return
+
+    yield from _iter_pdf_pages_parallel(os.fspath(source), page_count)
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    # Runs in a worker process; MuPDF documents cannot be pickled, so each task opens the file itself
+    with fitz.open(path) as doc:
+        return [doc[i].get_text("text") for i in range(start, stop)]
+
+@lru_cache(maxsize=1)
+def _page_executor() -> ProcessPoolExecutor:
+    # spawn rather than fork: the calling process already runs model and server threads
+    return ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+
+def _iter_pdf_pages_parallel(path: str, page_count: int) -> Iterator[str]:
+    # Only two tasks per worker are in flight, so pages extracted ahead of
+    # the caller stay bounded however long the document is
+    executor = _page_executor()
+    starts = iter(range(0, page_count, PAGES_PER_TASK))
+    pending = deque()
+
+    def submit_next():
+        start = next(starts, None)
+        if start is not None:
+            stop = min(start + PAGES_PER_TASK, page_count)
+            pending.append(executor.submit(_extract_page_range, path, start, stop))
+
+    for _ in range(2 * (os.cpu_count() or 1)):
+        submit_next()
+    try:
+        while pending:
+            pages = pending.popleft().result()
+            submit_next()
+            yield from pages
+    finally:
+        # The caller stopped early or a task failed
+        for future in pending:
+            future.cancel()
+
+# Alias for callers that pipeline a single PDF page by page
+parse_pdf_iter = iter_pdf_pages
+
+def _write_pages(doc, page_numbers) -> str:
+    # Pages are appended to one growing buffer instead of being collected into
+    # a list first, so at most one page's text exists outside it at a time
+    buffer = io.StringIO()
+    write = buffer.write
+    for i in page_numbers:
+        write(doc[i].get_text("text"))
+    return buffer.getvalue()
+
+def parse_pdf(source: Source) -> str:
+    """Extract the text of a PDF"""
+    with open_pdf(source) as doc:
+        return _write_pages(doc, range(doc.page_count))
+
+def parse_pdf_path(path: Union[str, os.PathLike]) -> str:
+    """Extract the text of a PDF on disk without reading it into memory first"""
+    return parse_pdf(os.fspath(path))
+
+# Extension (lower case, with the dot) -> function from a Source to its text
+_HANDLERS: Dict[str, Callable[[Source], str]] = {
+    ".pdf": parse_pdf,
+    ".txt": _decode_text,
+    ".md": _decode_text
+}
+
+def register_parser(file_extension: str, handler: Callable[[Source], str]):
+    """Register or replace the parser for a file extension such as '.docx'"""
+    _HANDLERS[file_extension.lower()] = handler
+
+@lru_cache(maxsize=1)
+def _parse_cache():
+    from diskcache import Cache
+    return Cache(PARSE_CACHE_DIR, size_limit=PARSE_CACHE_SIZE_LIMIT)
+
+def iter_pages_cached(source: Source, file_extension: str, content_hash: str) -> Iterator[str]:
+    """iter_pages memoized by content hash, so a re-upload skips PyMuPDF.
+
+    Recently parsed documents up to MEMORY_CACHE_MAX_CHARS long are
+    served from memory without touching the disk cache. Pages are only
+    collected while the document stays under that size, and only a
+    document iterated to the end is kept.
+    """
+    key = f"{content_hash}:{file_extension}"
+    with _parsed_lock:
+        pages = _parsed.get(key)
+        if pages is not None:
+            _parsed.move_to_end(key)
+    if pages is not None:
+        yield from pages
+        return
+
+    collected, size = [], 0
+    for page in _iter_pages_disk_cached(source, file_extension, content_hash):
+        if collected is not None:
+            size += len(page)
+            if size <= MEMORY_CACHE_MAX_CHARS:
+                collected.append(page)
+            else:
+                collected = None
+        yield page
+
+    if collected is not None:
+        with _parsed_lock:
+            _parsed[key] = tuple(collected)
+            _parsed.move_to_end(key)
+            if len(_parsed) > MEMORY_CACHE_SIZE:
+                _parsed.popitem(last=False)
+
+def _iter_pages_disk_cached(source: Source, file_extension: str, content_hash: str) -> Iterator[str]:
+    # Each page is stored under its own key as soon as it is produced, so
+    # only the current page is held in memory. The page count is written
+    # last; until then a partly parsed document is not treated as cached.
+    cache = _parse_cache()
+    key = f"{content_hash}:{file_extension}"
+    page_count = cache.get(f"{key}:pages")
+
+    served = 0
+    if page_count is not None:
+        while served < page_count and (page := cache.get(f"{key}:{served}")) is not None:
+            yield page
+            served += 1
+        if served == page_count:
+            return
+
+    # Not cached, or some pages were evicted: parse again, skipping pages already served
+    page_count = 0
+    for i, page in enumerate(iter_pages(source, file_extension, content_hash)):
+        page_count += 1
+        if i < served:
+            continue
+        cache.set(f"{key}:{i}", page)
+        yield page
+    cache.set(f"{key}:pages", page_count)
+
+def parse_file_cached(source: Source, file_extension: str, content_hash: Optional[str] = None) -> str:
+    if content_hash is None:
+        return parse_file(source, file_extension)
+    return "".join(iter_pages_cached(source, file_extension, content_hash))
@@ -1,22 +1,250 @@
-import chromadb
 import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
 
-# Use the new ChromaDB API with error handling
-try:
-    client = chromadb.PersistentClient(path="chroma_data")
-    collection = client.get_or_create_collection(name="rag_documents")
-except Exception as e:
-    print(f"Error initializing ChromaDB: {e}")
-    # If there's an error, try to recreate the database
-    if os.path.exists("chroma_data"):
-        import shutil
-        shutil.rmtree("chroma_data")
-    client = chromadb.PersistentClient(path="chroma_data")
-    collection = client.get_or_create_collection(name="rag_documents")
-
-def add_to_vectorstore(doc_id: str, text: str, embedding):
-    collection.add(
-        ids=[doc_id],
-        documents=[text],
-        embeddings=[embedding]
-    )
+PERSIST_DIRECTORY = "chroma_data"
+COLLECTION_NAME = "rag_documents"
+# Temporary names used while rebuild_index() swaps in a new collection
+REBUILD_NAME = f"{COLLECTION_NAME}_rebuild"
+REPLACED_NAME = f"{COLLECTION_NAME}_replaced"
+
+# Expected corpus size used to pick HNSW parameters for a new collection
+EXPECTED_VECTOR_COUNT = int(os.getenv("CHROMA_EXPECTED_VECTORS", "0"))
+
+# "hnsw" for approximate search, or "exact" for small corpora (roughly under
+# 1K passages), where a search_ef covering every vector makes each query
+# visit the whole graph and return exact neighbours
+INDEX_MODE = os.getenv("INTELLIDOC_INDEX_MODE", "hnsw").lower()
+EXACT_MIN_SEARCH_EF = 1000
+
+def configure_hnsw_params(vector_count: int, mode: str = INDEX_MODE) -> dict:
+    """Pick HNSW build and search parameters for a collection of the given size.
+
+    Larger graphs need more links per node (M) to keep recall up; search_ef
+    is raised well above Chroma's default of 10 for query recall.
+    """
+    if vector_count < 100_000:
+        m, construction_ef = 16, 128
+    elif vector_count < 1_000_000:
+        m, construction_ef = 24, 128
+    else:
+        m, construction_ef = 32, 200
+    # Embeddings are L2-normalized, so cosine distance ranks exactly like dot product
+    return {
+        "hnsw:space": "cosine",
+        "hnsw:M": m,
+        "hnsw:construction_ef": construction_ef,
+        # At least 10x the largest k the UI asks for (10)
+        "hnsw:search_ef": max(EXACT_MIN_SEARCH_EF, vector_count) if mode == "exact" else 100
+    }
+
+# HNSW parameters are fixed when the collection is first created
+COLLECTION_METADATA = configure_hnsw_params(EXPECTED_VECTOR_COUNT)
+
+# The store is opened on first use rather than at import, so importing this
+# module (or anything that imports it) does not pay for chromadb's import,
+# the SQLite open and any schema migration
+_client = None
+_open_lock = threading.Lock()
+
+# A store that fails to open (typically SQLite reporting the database as
+# locked while another process writes) is retried, never deleted
+OPEN_ATTEMPTS = 3
+OPEN_RETRY_DELAY = 1.0
+
+def _collection_names(client) -> set:
+    # Chroma 0.5 lists Collection objects, 0.6 lists names
+    return {getattr(collection, "name", collection) for collection in client.list_collections()}
+
+def _open():
+    global _client
+    import chromadb
+    from chromadb.config import Settings
+
+    settings = Settings(anonymized_telemetry=False, allow_reset=False)
+    for attempt in range(1, OPEN_ATTEMPTS + 1):
+        try:
+            client = chromadb.PersistentClient(path=PERSIST_DIRECTORY, settings=settings)
+            # A rebuild interrupted between its two renames leaves the
+            # original collection under REPLACED_NAME; put it back
+            names = _collection_names(client)
+            if COLLECTION_NAME not in names and REPLACED_NAME in names:
+                client.get_collection(REPLACED_NAME).modify(name=COLLECTION_NAME)
+            collection = client.get_or_create_collection(name=COLLECTION_NAME, metadata=COLLECTION_METADATA)
+            break
+        except Exception as e:
+            print(f"Error initializing ChromaDB (attempt {attempt}/{OPEN_ATTEMPTS}): {e}")
+            if attempt == OPEN_ATTEMPTS:
+                raise
+            time.sleep(OPEN_RETRY_DELAY)
+
+    # M cannot be changed on an existing index, so only warn when the corpus has grown past it
+    if configure_hnsw_params(collection.count())["hnsw:M"] > (collection.metadata or {}).get("hnsw:M", 16):
+        print(f"Collection '{COLLECTION_NAME}' has outgrown its HNSW parameters; call rebuild_index() to re-create it")
+
+    _client = client
+
+def get_client():
+    """Return the process-wide Chroma client, opening the store on first use"""
+    if _client is None:
+        with _open_lock:
+            if _client is None:
+                _open()
+    return _client
+
+def get_collection():
+    """Return the documents collection, opening the store on first use.
+
+    The collection is looked up by name on every call, so callers pick up
+    a collection swapped in by rebuild_index() in this or another process
+    instead of holding a handle to the deleted one.
+    """
+    return get_client().get_collection(COLLECTION_NAME)
+
+def __getattr__(name):
+    # Keeps `from vector_store.chroma_store import client, collection` working
+    if name == "client":
+        return get_client()
+    if name == "collection":
+        return get_collection()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Content hashes of documents indexed by this process, with their passage counts
+INDEXED_CACHE_SIZE = 1024
+_indexed = OrderedDict()
+_indexed_lock = threading.Lock()
+
+def remember_indexed(doc_id: str, passage_count: int):
+    with _indexed_lock:
+        _indexed[doc_id] = passage_count
+        _indexed.move_to_end(doc_id)
+        if len(_indexed) > INDEXED_CACHE_SIZE:
+            _indexed.popitem(last=False)
+
+def indexed_passage_count(doc_id: str) -> Optional[int]:
+    """Passage count of a document this process recently indexed, else None.
+
+    A hit is confirmed against the store, so a document deleted since,
+    for example by reset_vectorstore() in another process, is reported
+    as not indexed.
+    """
+    with _indexed_lock:
+        count = _indexed.get(doc_id)
+        if count is None:
+            return None
+        _indexed.move_to_end(doc_id)
+
+    if not get_collection().get(where={"parent": doc_id}, limit=1, include=[])["ids"]:
+        with _indexed_lock:
+            _indexed.pop(doc_id, None)
+        return None
+    return count
+
+def forget_indexed():
+    with _indexed_lock:
+        _indexed.clear()
+
+# Token rewritten whenever the stored passages change, so caches of
+# answers can tell they were computed against an older store
+STORE_VERSION_FILE = os.path.join(PERSIST_DIRECTORY, "store_version")
+
+def store_version() -> str:
+    """Return the current store version token, or "" if the store was never written"""
+    try:
+        with open(STORE_VERSION_FILE, encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+def bump_store_version():
+    """Give the store a new version token, visible to every process"""
+    os.makedirs(PERSIST_DIRECTORY, exist_ok=True)
+    tmp_path = f"{STORE_VERSION_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, STORE_VERSION_FILE)
+
+# Passages written per collection.upsert call; also keeps large uploads
+# under Chroma's maximum batch size
+ADD_BATCH_SIZE = 256
+
+def add_many_to_vectorstore(doc_ids, texts, embeddings, metadatas=None, batch_size: int = ADD_BATCH_SIZE):
+    """Insert or replace documents with one collection.upsert call per batch_size rows.
+
+    Passage ids are derived from the content hash, so re-indexing a
+    document overwrites its passages instead of duplicating them.
+
+    embeddings may be a 2-D array or a sequence of vectors; it is handed to
+    Chroma as one contiguous float32 array.
+    """
+    doc_ids = list(doc_ids)
+    texts = list(texts)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    collection = get_collection()
+    for start in range(0, len(doc_ids), batch_size):
+        end = start + batch_size
+        collection.upsert(
+            ids=doc_ids[start:end],
+            documents=texts[start:end],
+            embeddings=embeddings[start:end],
+            metadatas=metadatas[start:end] if metadatas is not None else None
+        )
+    bump_store_version()
+
+def rebuild_index(batch_size: int = ADD_BATCH_SIZE) -> int:
+    """Re-create the collection with HNSW parameters sized for its current contents.
+
+    Passages are copied batch_size at a time, without re-embedding, into a
+    new collection created with configure_hnsw_params(count). Only once the
+    copy is complete is it renamed into place and the old collection
+    deleted, so a failure part-way leaves the live collection untouched.
+    Passages written while the copy runs are not carried over. Returns
+    the number of passages copied.
+    """
+    client = get_client()
+    old = get_collection()
+    count = old.count()
+
+    # A partial copy left by an earlier failed rebuild
+    if REBUILD_NAME in _collection_names(client):
+        client.delete_collection(REBUILD_NAME)
+    new = client.create_collection(name=REBUILD_NAME, metadata=configure_hnsw_params(count))
+
+    for offset in range(0, count, batch_size):
+        data = old.get(limit=batch_size, offset=offset, include=["documents", "embeddings", "metadatas"])
+        new.upsert(
+            ids=data["ids"],
+            documents=data["documents"],
+            embeddings=np.ascontiguousarray(data["embeddings"], dtype=np.float32),
+            metadatas=data["metadatas"]
+        )
+
+    old.modify(name=REPLACED_NAME)
+    new.modify(name=COLLECTION_NAME)
+    client.delete_collection(REPLACED_NAME)
+    return count
+
+# Passage ids fetched and deleted per call by reset_vectorstore
+DELETE_BATCH_SIZE = 1024
+
+def reset_vectorstore(batch_size: int = DELETE_BATCH_SIZE):
+    """Delete every stored passage, keeping the collection itself.
+
+    Passages are deleted batch_size ids at a time, so the collection keeps
+    its identity and handles to it held elsewhere stay valid. This is the
+    only way the store is ever wiped; errors while opening it are retried
+    and raised instead.
+    """
+    collection = get_collection()
+    while ids := collection.get(limit=batch_size, include=[])["ids"]:
+        collection.delete(ids=ids)
+    forget_indexed()
+    bump_store_version()
+
+def add_to_vectorstore(doc_id: str, text: str, embedding: np.ndarray):
+    # A list is converted straight to float32 rather than via a float64 array
+    add_many_to_vectorstore([doc_id], [text], np.asarray(embedding, dtype=np.float32).reshape(1, -1))